@@ -45,9 +45,181 @@ from __future__ import division
 import numpy as np
 import matplotlib.pyplot as plt
 from astropy.io import fits
-import os
-from lmfit import Model
+from collections import namedtuple
 from scipy.integrate import trapz, simps
+from scipy.optimize import brentq, curve_fit
+from scipy.special import erf
+
+try:
+	from numba import njit
+except ImportError:
+	# Without numba the kernels below run as plain Python functions
+	def njit(*args, **kwargs):
+		if args and callable(args[0]):
+			return args[0]
+		return lambda f: f
+
+
+
+# Constants of the lines ratio kernels, in the order they take them
+
+Consts2p2 = namedtuple('Consts2p2', 'a f1 f2 f3 f4')
+Consts2p3 = namedtuple('Consts2p3', 'Oab Oag Obg Aab Aag')
+
+
+
+# h*c*1e10/k in [K Angstrom], the exponent of E() for a wavelength in Angstrom
+
+HCK = 6.62607004e-34*2.99792458e8*10**10/1.38064852e-23
+LN10 = np.log(10)    # Converts the log10(wavelength) of SDSS spectra
+
+gd, gs = 5, 1        # Statistical Weigths
+gb, gg = 4, 6        # Statistical Weigths
+V = 8.6e-6
+
+# Coarse temperature grid [K] of the brentq fallback of agn.ratio(), built
+# once for the default range Tmin=100, Tmax=1e5. It stays in float64:
+# E(-Lds,T) reaches ~1e143 at T=100 K, far above the float32 range
+
+_TE_GRID = np.geomspace(100, 1e5, 100)
+_TE_GRID_INV = 1/_TE_GRID
+_TE_GRID_SQRT_INV = 1/np.sqrt(_TE_GRID)
+
+
+
+# Numerical kernels of agn.ratio(). They only take scalar arguments, so
+# that numba can compile them
+
+@njit(cache=True)
+def _funct_2p2(T, J, Ne, a, f1, f2, f3, f4):
+	
+	"""
+	  Logarithm of the quotient between both sides of the 2p2 lines ratio
+	  equation, ln(y1/y2), and its derivative with respect to T. The
+	  exponent a is HCK/Lds
+	"""
+	
+	e_pos = np.exp(a/T)    # E(-Lds,T)
+	e_neg = 1/e_pos        # E(Lds,T), no second exponential needed
+	fac = f1*e_pos
+	Ns = Ne/(T**0.5)
+	y1 = fac*(Ns + f2*(1+(f3/f2)*e_neg))# +\
+		#Ne/(g*T**0.5)*(Ods/Opd2)*E(Lds,T))
+	y2 = J*(Ns+f4)# + \
+	#Ne*Ods/(g*Opd2)*E(Lds,T)*E(Lpd2,T)*E(-Lps,T))
+
+	# Derivatives of y1 and y2 with respect to T
+	dy1 = -a*y1/T**2 + fac*(-0.5*Ns/T + f3*a*e_neg/T**2)
+	dy2 = -0.5*J*Ns/T
+
+	return np.log(y1/y2), dy1/y1 - dy2/y2
+
+
+
+@njit(cache=True)
+def _g_2p2(T_inv, T_sqrt_inv, J, Ne, a, f1, f2, f3, f4):
+	
+	"""
+	  Difference y1-y2 of the 2p2 lines ratio equation, written as a single
+	  expression so that over a grid of temperatures numba evaluates it in
+	  one fused loop. Unlike ln(y1/y2) it stays defined where y2 < 0. It
+	  takes 1/T and 1/T**0.5, which for the grid are computed only once.
+	  The term f2*(f3/f2)*E(-Lds,T)*E(Lds,T) of y1 reduces to the constant f3
+	"""
+	
+	Ns = Ne*T_sqrt_inv
+	return f1*np.exp(a*T_inv)*(Ns + f2) + f1*f3 - J*(Ns + f4)
+
+
+
+@njit(cache=True)
+def _ratio_2p2(J, Ne, T0, Tmin, Tmax, a, f1, f2, f3, f4):
+	
+	"""
+	  Newton-Raphson over ln(y1/y2) in the variable x = 1/T, where the
+	  function is nearly linear, starting from T0 clamped into the range
+	  [Tmin, Tmax]. A step leaving the range is halved until it falls back
+	  inside it, at most 60 times. Where y1/y2 <= 0 the logarithm is not
+	  defined and the iteration stops as not converged. No fastmath here,
+	  since it would let numba assume that such NaNs never occur
+	  
+	  Returns the temperature and whether the iteration converged
+	"""
+	
+	xmin, xmax = 1/Tmax, 1/Tmin
+	x = min(max(1/T0, xmin), xmax)
+	
+	for i in range(50):
+		G, dG = _funct_2p2(1/x, J, Ne, a, f1, f2, f3, f4)
+		if not (np.isfinite(G) and np.isfinite(dG)) or dG == 0:
+			return 1/x, False    # y1/y2 <= 0, ln(y1/y2) is not defined
+		step = -G*x**2/dG    # dG/dx = -T^2 dG/dT
+		full = True
+		for k in range(60):
+			if xmin <= x-step <= xmax:
+				break
+			step = step/2
+			full = False
+		else:
+			return 1/x, False
+		x = x-step
+		if full and abs(step) < 1e-6*x:
+			return 1/x, True
+	
+	return 1/x, False
+
+
+
+@njit(cache=True)
+def _first_sign_change(G):
+	
+	"""
+	  First index i where G[i] and G[i+1] have different sign, or -1 if G
+	  does not change sign. Stops at the first change instead of scanning
+	  the whole array like np.argwhere(np.diff(np.sign(G))). Non-finite
+	  entries are skipped, and only consecutive finite values are compared
+	"""
+	
+	s = 0.0
+	for i in range(len(G)):
+		if not np.isfinite(G[i]):
+			s = 0.0
+			continue
+		s2 = np.sign(G[i])
+		if s2 == 0:
+			return min(i, len(G)-2)    # root on the grid point itself
+		if s != 0 and s2 != s:
+			return i-1
+		s = s2
+	return -1
+
+
+
+@njit(cache=True, fastmath=True)
+def _ratio_2p3(J, T, Oab, Oag, Obg, Aab, Aag):
+	
+	"""
+	  Density from the 2p3 lines ratio J at the temperature T
+	"""
+	
+	C = V/(T**0.5)
+	ff1 = 1+(Obg/Oab)+(Obg/Oag)
+	ff3 = gg/Oag
+	
+	up = (ff3/ff1)*Aag*Aab*(gg-J*gb)
+	down = C*(J*gb*Aab - gb*Aag)
+	
+	return up/down
+
+
+
+# Aitken delta-squared extrapolation of three successive iterates
+
+def _aitken(x0, x1, x2):
+	d = x2 - 2*x1 + x0
+	if d == 0:
+		return x2
+	return x2 - (x2-x1)**2/d
 
 
 
@@ -71,6 +243,8 @@ class agn:
 		self.ion1 = ion1
 		self.ion2 = ion2
 		self.show = show
+		self._last_T = None   # Last temperature found by ratio()
+		self._consts = {ion1: self.constants(ion1), ion2: self.constants(ion2)}
 
 		
 		
@@ -81,6 +255,9 @@ class agn:
 	k = 1.38064852e-23  # Boltzmann constant
 	T = 1000            # Arbitrary temperature value
 	
+	Tmin = 100          # Temperature range [K] where ratio() looks
+	Tmax = 1e5          # for the 2p2 solution
+
 	
 
 	# Dictionary of the constants for the ions (taken from [Astrophysics of gaseous
@@ -106,15 +283,42 @@ class agn:
 	
 	def E(self,val,T):
 		
-		h = 6.62607004e-34  # Planck constant
-		c = 2.99792458e8    # Light speed
-		k = 1.38064852e-23  # Boltzmann constant
-		y = np.exp(-h*c*10**10/(k*T*val))
+		y = np.exp(-HCK/(T*val))
 		
 		return y
 
 	
 	
+	# Unpack the constants of an ion for the numerical kernels
+	
+	def constants(self,ion):
+		
+		dic = self.values[ion]
+		
+		if ion=='OIII' or ion=='NII':
+			
+			g = dic['g']
+			Ods,  Lds,  Ads  = dic['Ods'], dic['Lds'], dic['Ads']
+			Ops,  Lps,  Aps  = dic['Ops'], dic['Lps'], dic['Aps']
+			Opd1, Lpd1, Adp1 = dic['Odp1'], dic['Ldp1'], dic['Adp1']
+			Opd2, Lpd2, Adp2 = dic['Odp2'], dic['Ldp2'], dic['Adp2']
+			
+			f1 = gd*Adp2*Lds/(gs*Ads*Lpd2)
+			f2 = gs*(Ads+Aps)/(g*V*Ops)
+			f3 = gs*Ads/(g*V*Opd2)
+			f4 = gd*Adp2/(g*V*Opd2)
+			
+			return Consts2p2(HCK/Lds, f1, f2, f3, f4)
+		
+		elif ion=='SII' or ion=='OII':
+			
+			Oab, Oag, Obg = dic['Oab'], dic['Oag'], dic['Obg']
+			Aab, Aag = dic['Aab'], dic['Aag']
+			
+			return Consts2p3(Oab, Oag, Obg, Aab, Aag)
+
+	
+	
 	# Define lines ratio function
 
 	def ratio(self,J, Ne=10, T=1000, ion='OIII'):
@@ -127,21 +331,21 @@ class agn:
 		  (O[III] or N[II] and S[II] or O[II]).
 		  
 		  If the selected ion is either O[III] or N[II], then the function
-		  returns (given an initial density), the temperature via calculating
-		  a sign change (name pending). For computational speed, the temperature
-		  value goes between 100 and 1e5 Kelvin. This range can be changed.
+		  returns (given an initial density), the temperature via a
+		  Newton-Raphson root find, starting from the temperature found in
+		  the previous call. The temperature value goes between Tmin=100 and
+		  Tmax=1e5 Kelvin. This range can be changed. If the iteration does
+		  not converge, the root is bracketed over a coarse grid and found with
+		  Brent's method.
 		  
 		  Otherwise, if the selected ion is N[II] or O[II], then the 
 		  function returns the density given a preliminar temperature
 		"""
 		
 		
-		# Constants values forthe available ions
-		
-		gd, gs = 5, 1    # Statistical Weigths
-		gb, gg = 4, 6    # Statistical Weigths
-		V = 8.6e-6    
-		dic = self.values[ion]
+		# Constants of the selected ion, unpacked once in __init__
+
+		consts = self._consts.get(ion) or self.constants(ion)
 		
 		
 		# Conditional selecting the avaliable ions
@@ -153,39 +357,31 @@ class agn:
 		
 		if ion=='OIII' or ion=='NII':
 			
-			g = dic['g']
-			Ods,  Lds,  Ads  = dic['Ods'], dic['Lds'], dic['Ads']
-			Ops,  Lps,  Aps  = dic['Ops'], dic['Lps'], dic['Aps']
-			Opd1, Lpd1, Adp1 = dic['Odp1'], dic['Ldp1'], dic['Adp1']
-			Opd2, Lpd2, Adp2 = dic['Odp2'], dic['Ldp2'], dic['Adp2']
-			
-			f1 = gd*Adp2*Lds/(gs*Ads*Lpd2)
-			f2 = gs*(Ads+Aps)/(g*V*Ops)
-			f3 = gs*Ads/(g*V*Opd2)
-			f4 = gd*Adp2/(g*V*Opd2)
-			
-			sol = []
-
-			def funct(T,J):
-				fac = f1*self.E(-Lds,T)
-				y1 = fac*(Ne/(T**0.5) + f2*(1+(f3/f2)*self.E(Lds,T)))# +\
-					#Ne/(g*T**0.5)*(Ods/Opd2)*self.E(Lds,T))
-				y2 = J*(Ne/(T**0.5)+f4)# + \
-				#Ne*Ods/(g*Opd2)*self.E(Lds,T)*self.E(Lpd2,T)*self.E(-Lps,T))
-				
-				return y1, y2
-			
-			# Numpy function to return the value of intesection between the 
-			# functions y1 and y2 returned in function func(self)
-			
-			Te = np.arange(100,1e5,0.1)
-			AA = funct(Te,J)[0]
-			BB = funct(Te,J)[1]
-			idx = np.argwhere(np.diff(np.sign(AA - BB))).flatten()
-			
-			sol = Te[idx]
-			
-			return sol[0]
+			sol, found = _ratio_2p2(J, Ne, self._last_T or 1e4, self.Tmin, self.Tmax,
+				*consts)
+
+			# If Newton-Raphson does not converge, look for a sign change of
+			# y1-y2 over a coarse grid and refine it with Brent's method
+
+			if not found:
+				def funct(T):
+					return _g_2p2(1/T, T**-0.5, J, Ne, *consts)
+
+				if self.Tmin == _TE_GRID[0] and self.Tmax == _TE_GRID[-1]:
+					Te, Te_inv, Te_sqrt_inv = _TE_GRID, _TE_GRID_INV, _TE_GRID_SQRT_INV
+				else:
+					Te = np.geomspace(self.Tmin, self.Tmax, 100)
+					Te_inv, Te_sqrt_inv = 1/Te, 1/np.sqrt(Te)
+				i = _first_sign_change(_g_2p2(Te_inv, Te_sqrt_inv, J, Ne, *consts))
+				if i < 0:
+					print('No temperature found between {} and {} K'.format(self.Tmin,self.Tmax))
+					print('Exit')
+					exit()
+				sol = brentq(funct, Te[i], Te[i+1], xtol=1e-2, rtol=1e-6)
+
+			self._last_T = sol
+
+			return sol
 		
 		###########################################################
 		
@@ -194,21 +390,7 @@ class agn:
 		
 		elif ion=='SII' or ion=='OII':
 			
-			val = self.values[ion]
-			C = V/(T**0.5)
-			Oab, Oag, Obg = val['Oab'], val['Oag'], val['Obg']
-			Aab, Aag = val['Aab'], val['Aag']
-			Lab, Lag = val['Lab'], val['Lag']
-
-			ff1 = 1+(Obg/Oab)+(Obg/Oag)
-			ff2 = gb/Oab
-			ff3 = gg/Oag
-			ff3/ff1
-			
-			up = (ff3/ff1)*Aag*Aab*(gg-J*gb)
-			down = C*(J*gb*Aab - gb*Aag)
-			
-			sol = up/down
+			sol = _ratio_2p3(J, T, *consts)
 			
 			# Return of the Density
 			
@@ -230,8 +412,8 @@ class agn:
 		  the above function ratio().
 		  
 		  This can be done in two ways. The first one is selecting the ion1 as
-		  either OIII or NII, and the second one selecting SII or NII for the 
-		  ion1. 
+		  either OIII or NII, and the second one selecting SII or OII for the 
+		  ion1 (and then OIII or NII for the ion2). 
 		  
 		  If the first method is selected, the input density (to find
 		  temperature for 2p3-like ions) is 1x10ˆ4 particles per cm3 which is
@@ -246,7 +428,10 @@ class agn:
 		  a temperature of 10000 kelvin. 
 		  
 		  The number of iteration, independent of the initial values for Density
-		  and Temperature, will be less than 4 iterations.
+		  and Temperature, will be less than 4 iterations. The iteration stops
+		  as soon as both values change by less than 1e-4 of their value, and
+		  every two steps it is accelerated with the Aitken extrapolation of 
+		  the last three values.
 		  
 		  The final return of this function is the temperature and density as 
 		  a python tuple in Kelvin and particles per cm3 respectively.
@@ -262,28 +447,63 @@ class agn:
 			print("\n Begin of iteration\n")
 			
 			#Begin of "iteration"
+			Ne = X
+			Ts = [T]
 			for i in range(0,4):
-				RES = T
+				RES, RES_Ne = T, Ne
 				Ne = self.ratio(J=self.J2,T=RES,ion=self.ion2)
 				T = self.ratio(J=self.J1,Ne=Ne,ion=self.ion1)
 				if self.show:
 					print("  Iteration {}\n Ne  {}  [part/cm3]\n T   {}  [K]\n".format(i+1,Ne,RES))
+				#Stop once both the temperature and density have converged
+				if abs(T-RES)/RES < 1e-4 and abs(Ne-RES_Ne)/abs(RES_Ne) < 1e-4:
+					break
+				#Aitken extrapolation of the last three temperatures, the
+				#sequence starts again from the extrapolated value. Not done on
+				#the last step, where no density would be computed from it
+				Ts.append(T)
+				if len(Ts) == 3 and i < 3:
+					T_accel = _aitken(*Ts)
+					Ts = [T]
+					if T_accel > 0:
+						converged = abs(T_accel-T)/T_accel < 1e-5
+						T, Ts = T_accel, [T_accel]
+						if converged:
+							Ne = self.ratio(J=self.J2,T=T,ion=self.ion2)
+							break
 			print(" Done!\n")
 			
 		###########################################################
 		
 		elif self.ion1=='SII' or self.ion1=='OII': #2p3
 			X = 1e4 #value of Temperature
-			Ne = self.ratio(J=self.J2,T=X,ion=self.ion2)
-			print("\n Begion of iteration\n")
+			Ne = self.ratio(J=self.J1,T=X,ion=self.ion1)
+			print("\n Begin of iteration\n")
 			
 			#Begin of "iteration"
+			T = X
+			Nes = [Ne]
 			for i in range(0,4):
-				RES = Ne
+				RES, RES_T = Ne, T
 				T = self.ratio(J=self.J2,Ne=RES,ion=self.ion2)
-				Ne = ratio(J=J1,T=T,ion=ion1)
+				Ne = self.ratio(J=self.J1,T=T,ion=self.ion1)
 				if self.show:
 					print("  Iteration {}\n Ne  {}  [part/cm3]\n T   {}  [K]\n".format(i+1,RES,T))
+				#Stop once both the temperature and density have converged
+				if abs(Ne-RES)/abs(RES) < 1e-4 and abs(T-RES_T)/RES_T < 1e-4:
+					break
+				#Aitken extrapolation of the last three densities (not on the
+				#last step)
+				Nes.append(Ne)
+				if len(Nes) == 3 and i < 3:
+					Ne_accel = _aitken(*Nes)
+					Nes = [Ne]
+					if Ne_accel > 0:
+						converged = abs(Ne_accel-Ne)/Ne_accel < 1e-5
+						Ne, Nes = Ne_accel, [Ne_accel]
+						if converged:
+							T = self.ratio(J=self.J2,Ne=Ne,ion=self.ion2)
+							break
 			print(" Done!\n")
 			
 		#Return Temperature and Density 
@@ -314,29 +534,45 @@ class spectrum:
 		self.data = data
 		self.header = header
 		self.z = z
+		self._cached = None   # (data, header, z) of the last read and its result
+		
+		# Read the spectrum once, the methods below work on these arrays
+		self.x_axis, self.y_axis, self.head = None, None, None
+		if isinstance(data,str) and z is not None:
+			self.read(data,header,z)
 	
 	
 	def read(self,data,header,z=None):
 		
+		# Reuse the arrays of the last call if it read the same file
+		key = (data, header, z)
+		if self._cached is not None and self._cached[0] == key:
+			return self._cached[1]
+		
 		if isinstance(data,str):
 			if z is None:
 				print('Provide a Redshift')
 				print('Exit')
 				exit()
 			else:
-				array = fits.getdata(self.data,0)
-				x, y = [], []  #Wavelength and flux
-				for i in range(len(array)):
-					y.append(array[i][0])
-					x.append(10**array[i][1])
-				x = np.array(x)
-				y = np.array(y)
-				xnew = x/(z+1)
+				array = fits.getdata(data,0)
+				y = np.ascontiguousarray(array.field(0),dtype=np.float64)    #Flux
+				#Wavelength as exp(ln(10)*loglam), in place on a float64 copy
+				x = array.field(1).astype(np.float64)
+				np.multiply(x,LN10,out=x)
+				np.exp(x,out=x)
+				x /= (z+1)
+				xnew = x
+				self.x_axis, self.y_axis = xnew, y
 				if header == True:
 					header = fits.getheader(data,0)
-					return xnew, y, header
+					self.head = header
+					result = xnew, y, header
 				else:
-					return xnew, y
+					self.head = None
+					result = xnew, y
+				self._cached = (key, result)
+				return result
 		else:
 			print('Not valid dataset ... Abort')
 			exit()
@@ -344,10 +580,8 @@ class spectrum:
 
 	def plot(self):
 		
-		if self.header == True:
-			x_axis, y_axis, head = self.read(self.data,self.header)
-		else:
-			x_axis, y_axis = self.read(self.data,self.header)
+		# read() returns the cached arrays unless data, header or z changed
+		x_axis, y_axis = self.read(self.data,self.header,self.z)[:2]
 		
 		plt.figure(figsize=(8,5))
 		plt.plot(x_axis,y_axis)
@@ -358,14 +592,13 @@ class spectrum:
 
 
 	def limits(self,statistics=False,plot=True,ax=None,
-		savefig=False,show_model=False):
+		savefig=False,show_model=False,interactive=False):
 		
 		
 		
-		if self.header == True:
-			x_axis, y_axis, head = self.read(self.data,self.header,self.z)
-		else:
-			x_axis, y_axis = self.read(self.data,self.header,self.z)
+		# read() returns the cached arrays unless data, header or z changed
+		self.read(self.data,self.header,self.z)
+		x_axis, y_axis, head = self.x_axis, self.y_axis, self.head
 		
 		
 		def gaussian(x, amp, cen, wid):
@@ -393,21 +626,22 @@ class spectrum:
 			if savefig == True:
 				v = ind+1
 				plt.savefig(str(v)+'gaussian.png')
-			else:
-				plt.savefig("temp.png")
-				os.system("rm -rf temp.png")
 
-			plt.pause(1) # <-------
-			#input("<Hit Enter To Close>")
-			plt.waitforbuttonpress(0)
+			if interactive == True:
+				plt.pause(1) # <-------
+				#input("<Hit Enter To Close>")
+				plt.waitforbuttonpress(0)
+			else:
+				plt.draw()
+				plt.pause(0.001)
 			plt.close()
 
 			plt.show()
 
 
 		def statistics_fit(y_axis,x_range,y_range,x1,x2,x01,x02,X,Y):
-			maxy = max(y_axis[x1-1:x2+1])
-			miny = min(y_axis[x1-1:x2+1])
+			window = y_axis[x1-1:x2+1]
+			maxy, miny = window.max(), window.min()
 			equi = eqw(x01,x02,maxy,miny)
 			print('\nStatistics\n')
 			print(' Min Value:  {0:.3f}  Flux'.format(miny))
@@ -421,10 +655,12 @@ class spectrum:
 		
 		def windows(x_axis,y_axis,wavelength1=6734,wavelength2=6760, legend='6716$\AA$',line=4382.4):
 			
-			xx1 = np.where(abs(x_axis-wavelength1+1) <= 1)[0][0]
-			xx2 = np.where(abs(x_axis-wavelength2-2) <= 1)[0][0]
+			# x_axis is sorted, so the first wavelength within [w-2, w] (and
+			# [w+1, w+3]) is found by bisection
+			xx1 = np.searchsorted(x_axis,wavelength1-2)
+			xx2 = np.searchsorted(x_axis,wavelength2+1)
 			#maxvaly = max(y_axis[xx1:xx2])
-			#maxvalx = np.where(y_axis == maxvaly)[0][0]
+			#maxvalx = xx1 + np.argmax(y_axis[xx1:xx2])
 			#print(maxvalx)
 			plt.plot(x_axis[xx1:xx2],y_axis[xx1:xx2],'o-',color='b',label=legend)
 			#plt.axvline(x=maxvalx,linewidth=3,alpha=0.7)
@@ -439,7 +675,7 @@ class spectrum:
 			return x01,x02
 		
 		
-		def lines(num=4):
+		def lines(num,x_axis,y_axis):
 			
 			# Set the limit to show the plot for the selected ions
 			waves = [[6706,6732,'S[II]: 6716$\AA$',6718],[6723,6742,'S[II]: 6731$\AA$',6732],
@@ -449,8 +685,8 @@ class spectrum:
 			x01, x02 = windows(x_axis=x_axis,y_axis=y_axis,wavelength1=waves[num][0],
 			wavelength2=waves[num][1],legend=waves[num][2],line=waves[num][3])
 			
-			x1 = np.where(abs(x_axis-x01+1) <= 1)[0][0]
-			x2 = np.where(abs(x_axis-x02-2) <= 1)[0][0]
+			x1 = np.searchsorted(x_axis,x01-2)
+			x2 = np.searchsorted(x_axis,x02+1)
 			
 			if y_axis[x1] <= y_axis[x2]:
 				mini = y_axis[x1]
@@ -460,29 +696,41 @@ class spectrum:
 			x_range = x_axis[x1:x2]
 			y_range = y_axis[x1:x2]-mini
 
-			gmodel = Model(gaussian)
-			result = gmodel.fit(y_range,x=x_range,amp=1000,cen=x_range[0],wid=1.5)
+			# Levenberg-Marquardt fit straight from scipy
+			popt, pcov = curve_fit(gaussian,x_range,y_range,p0=[1000,x_range[0],1.5])
 			
-			amp = result.best_values['amp']
-			cen = result.best_values['cen']
-			wid = result.best_values['wid']
+			amp, cen, wid = popt
+			best_fit = gaussian(x_range, amp=amp, cen=cen, wid=wid)
 			X = np.linspace(x_range[0],x_range[-1],1000)
 			Y = gaussian(X, amp=amp, cen=cen, wid=wid)
 			
 			
 			if show_model == True:
-				print(gmodel.param_names)
-				print(result.fit_report(show_correl=False))
-				result.plot()
-				print(result.best_values)
+				names = ['amp', 'cen', 'wid']
+				stderr = np.sqrt(np.diag(pcov))
+				print(names)
+				print('[[Variables]]')
+				for name, value, err in zip(names, popt, stderr):
+					print('    {}:  {} +/- {}'.format(name, value, err))
+				plt.figure()
+				plt.subplot(211)
+				plt.plot(x_range,y_range-best_fit,'o')
+				plt.ylabel('Residuals')
+				plt.subplot(212)
+				plt.plot(x_range,y_range,'o',label='data')
+				plt.plot(x_range,best_fit,'-',label='best-fit')
+				plt.legend()
+				print(dict(zip(names, popt)))
 			else:
 				pass
 				
 				
-			AREA = trapz(Y,X)
+			# Area of the fitted gaussian between both ends of the window, from
+			# its analytic integral instead of integrating Y numerically
+			AREA = amp*(erf((X[-1]-cen)/(wid*np.sqrt(2))) - erf((X[0]-cen)/(wid*np.sqrt(2))))/2
 			
 			if plot == True:
-				plot_fit(ax,result.best_fit,x_range,y_range,X,Y,mini,area=AREA,ind=num)
+				plot_fit(ax,best_fit,x_range,y_range,X,Y,mini,area=AREA,ind=num)
 			else:
 				#pass
 				plt.show()
@@ -494,13 +742,13 @@ class spectrum:
 				pass
 			
 			if self.header == True:
-				return AREA,result.best_fit,x_axis,y_axis,X,Y,head
+				return AREA,best_fit,x_axis,y_axis,X,Y,head
 			else:
-				return AREA,result.best_fit,x_axis,y_axis,X,Y
+				return AREA,best_fit,x_axis,y_axis,X,Y
 		
 		area = []
 		for i in range(0,5):
-			area.append(lines(i)[0])
+			area.append(lines(i,x_axis,y_axis)[0])
 		
 		return area
 
@@ -510,7 +758,7 @@ class spectrum:
 ####################
 
 
-def calculation(name=None, ion1=None, ion2=None, statistics=False, header=False, plot=True, savefig=False, ax=None, show_model=False, iteration=True, plot_spectrum=False,z = 0.00420765,**kwargs):
+def calculation(name=None, ion1=None, ion2=None, statistics=False, header=False, plot=True, savefig=False, ax=None, show_model=False, iteration=True, plot_spectrum=False,z = 0.00420765, interactive=False,**kwargs):
 	
 	
 	if not name:
@@ -527,7 +775,11 @@ def calculation(name=None, ion1=None, ion2=None, statistics=False, header=False,
 		print('  The user will be asked for the lines to work with:')
 		print('   Avaliable ions: ')
 		print('     O[III] or N[II]\n     S[II]  or O[II]')
-		print('  \n  After selecting the two points, press enter to pass the next flux\n')
+		if interactive == True:
+			print('  \n  After selecting the two points, press a key or click on the fit to pass the next flux\n')
+		else:
+			print('  \n  After selecting the two points the fit is shown briefly and the next flux follows')
+			print('  (use interactive=True to keep each fit open until a key or click)\n')
 		input('  < Press enter to continue > ')
 		print(' ')
 
@@ -560,7 +812,7 @@ def calculation(name=None, ion1=None, ion2=None, statistics=False, header=False,
 	if plot_spectrum is True:
 		data.plot()
 	
-	A = data.limits(statistics=statistics,plot=plot,savefig=savefig,ax=ax,show_model=show_model)
+	A = data.limits(statistics=statistics,plot=plot,savefig=savefig,ax=ax,show_model=show_model,interactive=interactive)
 
 	F6716, F6731 = A[0], A[1]
 	F4363, F4959, F5007 = A[2], A[3], A[4]